@@ -1,17 +1,37 @@
 from fastapi import FastAPI, Request, Form, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from typing import List, Dict
+from typing import Callable, List, Dict
+from collections import Counter
+from operator import itemgetter
 import csv
+import hashlib
+import mmap
 import os
 import io
+import logging
 import re
+import sys
+import threading
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:  # optional; the stdlib csv module is used instead
+    pa = None
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(__file__)
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 COLLECTION_FILE = os.path.join(DATA_DIR, 'HotWheelsGitCollection.csv')
+COLLECTION_JOURNAL = os.path.join(DATA_DIR, 'HotWheelsGitCollection.jnl')
 MASTER_FILE = os.path.join(DATA_DIR, 'DONE_HotWheels1_commas.csv')
+JOURNAL_COMPACT_EVERY = 500
+# large reads/writes mean fewer syscalls on big CSV files (the default is 8 KiB)
+IO_BUFFER_SIZE = 1 << 20
+DOWNLOAD_CHUNK_ROWS = 500
 REQUIRED_FIELDS = ["toy_number", "name", "year", "series", "image_url", "quantity"]
 
 app = FastAPI(title="Hot Wheels Collection")
@@ -19,6 +39,27 @@ templates = Jinja2Templates(directory=os.path.join(BASE_DIR, 'templates'))
 app.mount('/static', StaticFiles(directory=os.path.join(BASE_DIR, 'static')), name='static')
 
 SERIES_CLEAN_RE = re.compile(r"(New for \d{4}|2nd Color|Exclusive)", re.IGNORECASE)
+BULK_ENTRY_RE = re.compile(r'(?:x?(\d+)\s*)?([A-Za-z0-9]+)')
+
+
+def make_row(toy_number: str, name: str, year: str, series: str, image_url: str, quantity: str) -> Dict[str, str]:
+    """Build a parsed row, normalizing only the fields that need it.
+
+    toy_number is upper-cased once here so lookups never have to; year/series
+    values repeat heavily and are interned.
+    """
+    return {
+        'toy_number': toy_number.strip().upper(),
+        'name': name,
+        'year': sys.intern(year.strip()),
+        'series': sys.intern(series),
+        'image_url': image_url,
+        'quantity': quantity.strip(),
+    }
+
+
+def row_content(row: Dict[str, str]) -> tuple[str, ...]:
+    return tuple(row[k] for k in REQUIRED_FIELDS)
 
 
 def normalize_series(series: str) -> str:
@@ -26,13 +67,54 @@ def normalize_series(series: str) -> str:
     return SERIES_CLEAN_RE.sub('', series).strip()
 
 
-class CSVCache:
-    """Simple cache that reloads CSV when the file changes."""
+def progress_key(row: Dict[str, str]) -> str:
+    """Key used to group rows on the compare page."""
+    return f"{normalize_series(row['series'])} {row['year']}"
+
+
+def with_progress_key(row: Dict[str, str]) -> Dict[str, str]:
+    row['_key'] = progress_key(row)
+    return row
+
 
-    def __init__(self, path: str):
+class CSVCache:
+    """Simple cache that reloads CSV when the file changes.
+
+    With a journal_path, edits are appended to that file as ADD/SET/DEL lines
+    and replayed on load; the CSV is only rewritten on compaction. The first
+    journal line records the hash of the CSV it applies to; a journal written
+    against another CSV is set aside as <journal>.stale instead of replayed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        row_transform: Callable[[Dict[str, str]], Dict[str, str]] | None = None,
+        count_key: Callable[[Dict[str, str]], str] | None = None,
+        journal_path: str | None = None,
+        compact_every: int = JOURNAL_COMPACT_EVERY,
+        use_arrow: bool = False,
+    ):
         self.path = path
+        self.use_arrow = use_arrow
+        # guards reparse and writes; handlers run in a threadpool
+        self.lock = threading.RLock()
+        self.journal_path = journal_path
+        self.compact_every = compact_every
+        self.row_transform = row_transform
+        self.count_key = count_key
         self.mtime: float | None = None
+        self.version = 0
         self.data: List[Dict[str, str]] = []
+        self.counts: Counter[str] = Counter()
+        self._index: Dict[str, List[Dict[str, str]]] | None = None
+        self._columns: Dict[str, List[str]] = {}
+        self._quantity_total: int | None = None
+        self._size: int | None = None
+        self._hash: bytes | None = None
+        self._journal_state: tuple[float, int] | None = None
+        self._journal_entries = 0
+        self._pending: List[List[str]] = []
         self.ensure_file()
 
     def ensure_file(self) -> None:
@@ -43,86 +125,392 @@ class CSVCache:
                 writer.writeheader()
             self.mtime = os.path.getmtime(self.path)
 
+    def fingerprint(self) -> bytes:
+        """Hash the file contents without copying them into Python objects."""
+        digest = hashlib.blake2b(digest_size=16)
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    digest.update(mm)
+        return digest.digest()
+
+    def _journal_stat(self) -> tuple[float, int] | None:
+        """(mtime, size) of the journal; size catches appends within one mtime tick."""
+        if not self.journal_path:
+            return None
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime, stat.st_size
+
+    @property
+    def tag(self) -> str:
+        """Changes with every edit, journalled ones included, and after restarts with pending edits."""
+        journal = '{}:{}'.format(*self._journal_state) if self._journal_state else ''
+        return f'{self.mtime}-{journal}-{self.version}'
+
     def load(self) -> List[Dict[str, str]]:
-        self.ensure_file()
-        stat = os.stat(self.path)
-        if self.mtime != stat.st_mtime:
-            with open(self.path, newline='', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                if reader.fieldnames != REQUIRED_FIELDS:
+        try:
+            if os.stat(self.path).st_mtime == self.mtime and self._journal_stat() == self._journal_state:
+                return self.data
+        except FileNotFoundError:
+            pass
+        # re-checked under the lock so concurrent callers parse only once
+        with self.lock:
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                # recreated files are parsed like any other change
+                self.ensure_file()
+                self.mtime = None
+                stat = os.stat(self.path)
+            journal_state = self._journal_stat()
+            if self.mtime != stat.st_mtime or self._journal_state != journal_state:
+                # mtime alone is unreliable (touch, git checkout); skip reparse if bytes are unchanged.
+                # Only hash when it can pay off: a same-size file may be unchanged, and a journal needs BASE
+                fingerprint = None
+                if stat.st_size == self._size or self.journal_path:
+                    fingerprint = self.fingerprint()
+                if (fingerprint is not None and fingerprint == self._hash
+                        and journal_state == self._journal_state and stat.st_size == self._size):
+                    self.mtime = stat.st_mtime
+                    return self.data
+                header, rows = self._parse()
+                replayed = self._replay(rows, fingerprint)
+                if self.row_transform:
+                    rows = [self.row_transform(row) for row in rows]
+                if header != REQUIRED_FIELDS:
                     # auto-fix invalid headers
-                    rows = [row for row in reader]
                     self.save(rows)
                 else:
-                    self.data = [{k: row.get(k, '').strip() for k in REQUIRED_FIELDS} for row in reader]
-            self.mtime = stat.st_mtime
-        return self.data
+                    self.data = rows
+                    self._reindex()
+                    # only trust the hash if the bytes were the same before and after parsing;
+                    # mtime can't tell, a same-size rewrite may land in the same timestamp tick
+                    self._size = stat.st_size
+                    if fingerprint is not None and self.fingerprint() != fingerprint:
+                        fingerprint = None
+                    self._hash = fingerprint
+                    # _replay may have set a stale journal aside
+                    self._journal_state = self._journal_stat()
+                    self._journal_entries = replayed
+                self.mtime = stat.st_mtime
+            return self.data
+
+    def _parse(self) -> tuple[List[str], List[Dict[str, str]]]:
+        if self.use_arrow and pa is not None:
+            try:
+                return self._parse_arrow()
+            except pa.ArrowInvalid:
+                pass  # empty, ragged or duplicate-header file; the csv module copes with those
+        return self._parse_csv()
+
+    def _parse_csv(self) -> tuple[List[str], List[Dict[str, str]]]:
+        with open(self.path, newline='', encoding='utf-8', buffering=IO_BUFFER_SIZE) as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            width = len(header)
+            idx = [header.index(k) if k in header else None for k in REQUIRED_FIELDS]
+            rows = []
+            if None in idx:
+                # columns missing from the header are always blank, whatever a ragged row holds
+                for row in reader:
+                    if not row:
+                        continue
+                    if len(row) < width:
+                        row += [''] * (width - len(row))
+                    rows.append(make_row(*(row[i] if i is not None else '' for i in idx)))
+            else:
+                t, n, y, se, im, q = idx
+                for row in reader:
+                    if not row:
+                        continue
+                    if len(row) < width:
+                        row += [''] * (width - len(row))
+                    rows.append(make_row(row[t], row[n], row[y], row[se], row[im], row[q]))
+        return header, rows
+
+    def _parse_arrow(self) -> tuple[List[str], List[Dict[str, str]]]:
+        """Multithreaded parse for large static files such as the master list."""
+        options = pa_csv.ConvertOptions(column_types={k: pa.string() for k in REQUIRED_FIELDS})
+        table = pa_csv.read_csv(self.path, convert_options=options)
+        header = table.column_names
+        if len(set(header)) != len(header):
+            # table.column() refuses ambiguous names; the csv parser takes the first one
+            raise pa.ArrowInvalid(f'duplicate column names in {self.path}')
+        columns = [table.column(k).to_pylist() if k in header else [''] * table.num_rows for k in REQUIRED_FIELDS]
+        return header, [make_row(*values) for values in zip(*columns)]
+
+    def _replay(self, rows: List[Dict[str, str]], base_hash: bytes) -> int:
+        """Apply journal entries to freshly parsed rows; returns the number of entries.
+
+        Entries identify rows by their full contents, so rows sharing a
+        toy_number replay exactly; rows with identical contents are interchangeable.
+        """
+        if not self.journal_path:
+            return 0
+        try:
+            with open(self.journal_path, newline='', encoding='utf-8') as f:
+                entries = [e for e in csv.reader(f) if e]
+        except FileNotFoundError:
+            return 0
+        if not entries or entries[0] != ['BASE', base_hash.hex()]:
+            # written against another CSV: compaction finished but the journal wasn't removed,
+            # or the CSV was edited by hand; keep the edits around for manual recovery
+            stale_path = self.journal_path + '.stale'
+            os.replace(self.journal_path, stale_path)
+            logger.warning('%s does not match %s; moved it to %s', self.journal_path, self.path, stale_path)
+            return 0
+        width = len(REQUIRED_FIELDS)
+        by_content: Dict[tuple[str, ...], List[Dict[str, str]]] = {}
+        for r in rows:
+            by_content.setdefault(row_content(r), []).append(r)
+        dropped = set()
+        # a truncated last line (crash mid-append) fails the length checks and is skipped
+        for op, *values in entries[1:]:
+            key = tuple(values[:width])
+            if op == 'ADD' and len(values) == width:
+                row = dict(zip(REQUIRED_FIELDS, values))
+                rows.append(row)
+                by_content.setdefault(key, []).append(row)
+            elif op == 'SET' and len(values) == width + 1 and by_content.get(key):
+                row = by_content[key].pop(0)
+                row['quantity'] = values[width]
+                by_content.setdefault(row_content(row), []).append(row)
+            elif op == 'DEL' and len(values) == width and by_content.get(key):
+                dropped.add(id(by_content[key].pop(0)))
+        if dropped:
+            rows[:] = [r for r in rows if id(r) not in dropped]
+        return len(entries) - 1
+
+    def _log(self, op: str, row: Dict[str, str], *extra: str) -> None:
+        if self.journal_path:
+            self._pending.append([op, *row_content(row), *extra])
+
+    def _reindex(self) -> None:
+        self.version += 1
+        self._index = None
+        self._columns = {}
+        self._quantity_total = None
+        self.counts = Counter(map(self.count_key, self.data)) if self.count_key else Counter()
+
+    def get_all(self, toy_number: str) -> List[Dict[str, str]]:
+        """All rows for an (upper-case) toy number in file order, building the index on demand."""
+        self.load()
+        index = self._index
+        if index is None:
+            # built under the lock so a concurrent edit can't land between the scan and the store
+            with self.lock:
+                if self._index is None:
+                    index = {}
+                    for r in self.data:
+                        index.setdefault(r['toy_number'], []).append(r)
+                    self._index = index
+                index = self._index
+        return index.get(toy_number, [])
+
+    def get(self, toy_number: str) -> Dict[str, str] | None:
+        """First row for a toy number, matching a linear scan."""
+        rows = self.get_all(toy_number)
+        return rows[0] if rows else None
+
+    def column(self, name: str) -> List[str]:
+        """Values of one field across all rows, cached until the data changes."""
+        self.load()
+        values = self._columns.get(name)
+        if values is None:
+            with self.lock:
+                values = self._columns.get(name)
+                if values is None:
+                    values = self._columns[name] = [r[name] for r in self.data]
+        return values
+
+    def quantity_total(self) -> int:
+        """Sum of all quantities, kept up to date by add/remove/set_quantity."""
+        self.load()
+        total = self._quantity_total
+        if total is None:
+            with self.lock:
+                if self._quantity_total is None:
+                    self._quantity_total = sum(int(q or 0) for q in self.column('quantity'))
+                total = self._quantity_total
+        return total
+
+    def add(self, row: Dict[str, str]) -> None:
+        """Append a row in memory, keeping the index and counts current."""
+        with self.lock:
+            self.data.append(row)
+            self.version += 1
+            self._columns = {}
+            if self._quantity_total is not None:
+                self._quantity_total += int(row['quantity'] or 0)
+            if self._index is not None:
+                self._index.setdefault(row['toy_number'], []).append(row)
+            if self.count_key:
+                self.counts[self.count_key(row)] += 1
+            self._log('ADD', row)
+
+    def remove(self, row: Dict[str, str]) -> None:
+        """Drop a row in memory, keeping the index and counts current."""
+        with self.lock:
+            # by identity: duplicate rows may compare equal
+            del self.data[next(i for i, r in enumerate(self.data) if r is row)]
+            self.version += 1
+            self._columns = {}
+            if self._quantity_total is not None:
+                self._quantity_total -= int(row['quantity'] or 0)
+            if self._index is not None:
+                same = [r for r in self._index.get(row['toy_number'], []) if r is not row]
+                if same:
+                    self._index[row['toy_number']] = same
+                else:
+                    self._index.pop(row['toy_number'], None)
+            if self.count_key:
+                self.counts[self.count_key(row)] -= 1
+            self._log('DEL', row)
+
+    def set_quantity(self, row: Dict[str, str], quantity: int) -> None:
+        with self.lock:
+            self._log('SET', row, str(quantity))
+            if self._quantity_total is not None:
+                self._quantity_total += quantity - int(row['quantity'] or 0)
+            row['quantity'] = str(quantity)
+            self.version += 1
+            self._columns.pop('quantity', None)
+
+    def commit(self) -> None:
+        """Persist in-memory edits: append them to the journal, or rewrite the CSV if there is none."""
+        with self.lock:
+            if not self.journal_path:
+                self.save(self.data)
+                return
+            if not self._pending:
+                return
+            with open(self.journal_path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if not f.tell():
+                    writer.writerow(['BASE', (self._hash or self.fingerprint()).hex()])
+                writer.writerows(self._pending)
+            self._journal_entries += len(self._pending)
+            self._pending = []
+            self._journal_state = self._journal_stat()
+            if self._journal_entries >= self.compact_every:
+                self.compact()
+
+    def compact(self) -> None:
+        """Fold the journal into the CSV."""
+        with self.lock:
+            self.load()
+            self.save(self.data)
 
     def save(self, rows: List[Dict[str, str]]) -> None:
-        self.ensure_file()
-        with open(self.path, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=REQUIRED_FIELDS)
-            writer.writeheader()
-            for row in rows:
-                writer.writerow(row)
-        self.mtime = os.path.getmtime(self.path)
-        self.data = rows
-
-
-collection_cache = CSVCache(COLLECTION_FILE)
-master_cache = CSVCache(MASTER_FILE)
+        with self.lock:
+            self.ensure_file()
+            # write aside and swap in, so a crash never leaves a half-written CSV
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', newline='', encoding='utf-8', buffering=IO_BUFFER_SIZE) as f:
+                writer = csv.writer(f)
+                writer.writerow(REQUIRED_FIELDS)
+                writer.writerows([row[k] for k in REQUIRED_FIELDS] for row in rows)
+            os.replace(tmp_path, self.path)
+            stat = os.stat(self.path)
+            self.mtime = stat.st_mtime
+            self._size = stat.st_size
+            self._hash = self.fingerprint()
+            if self.journal_path:
+                # the CSV now holds every journalled edit
+                try:
+                    os.remove(self.journal_path)
+                except FileNotFoundError:
+                    pass
+                self._journal_state = None
+                self._journal_entries = 0
+                self._pending = []
+            if rows is not self.data:
+                # rows edited through add()/remove() are already indexed
+                self.data = rows
+                self._reindex()
+
+
+collection_cache = CSVCache(COLLECTION_FILE, count_key=progress_key, journal_path=COLLECTION_JOURNAL)
+master_cache = CSVCache(
+    MASTER_FILE, row_transform=with_progress_key, count_key=itemgetter('_key'), use_arrow=True,
+)
 
 
 # ---------------------- helper functions ----------------------
 
 def find_in_master(toy_number: str) -> Dict[str, str] | None:
-    toy_number = toy_number.upper().strip()
-    for row in master_cache.load():
-        if row['toy_number'].upper() == toy_number:
-            return row
-    return None
+    return master_cache.get(toy_number.upper().strip())
 
 
-def add_or_update_model(toy_number: str, quantity: int) -> Dict[str, str]:
+def _apply_model(toy_number: str, quantity: int) -> Dict[str, str]:
+    """Add or update a collection row in memory; the caller saves."""
     if quantity < 1:
         raise HTTPException(status_code=400, detail="Quantity must be positive")
     master_row = find_in_master(toy_number)
     if not master_row:
         raise HTTPException(status_code=400, detail="Invalid toy_number")
 
-    rows = collection_cache.load()
-    for row in rows:
-        if row['toy_number'] == master_row['toy_number'] and row['image_url'] == master_row['image_url']:
-            new_q = max(int(row.get('quantity', '1')) + quantity, 1)
-            row['quantity'] = str(new_q)
-            collection_cache.save(rows)
-            return row
+    row = next((r for r in collection_cache.get_all(master_row['toy_number'])
+                if r['image_url'] == master_row['image_url']), None)
+    if row:
+        new_q = max(int(row.get('quantity', '1')) + quantity, 1)
+        collection_cache.set_quantity(row, new_q)
+        return row
 
     new_row = {k: master_row[k] for k in REQUIRED_FIELDS[:-1]}
     new_row['quantity'] = str(quantity)
-    rows.append(new_row)
-    collection_cache.save(rows)
+    collection_cache.add(new_row)
     return new_row
 
 
+def add_or_update_model(toy_number: str, quantity: int) -> Dict[str, str]:
+    with collection_cache.lock:
+        row = _apply_model(toy_number, quantity)
+        collection_cache.commit()
+    return row
+
+
+def add_or_update_model_batch(entries: List[tuple[str, int]]) -> List[Dict[str, str]]:
+    """Apply several entries, skipping invalid ones, and write the CSV once."""
+    added = []
+    with collection_cache.lock:
+        for toy, qty in entries:
+            try:
+                added.append(_apply_model(toy, qty))
+            except HTTPException:
+                continue
+        if added:
+            collection_cache.commit()
+    return added
+
+
 def parse_bulk(text: str) -> List[tuple[str, int]]:
-    pattern = re.compile(r'(?:x?(\d+)\s*)?([A-Za-z0-9]+)')
-    return [(toy.upper(), int(qty) if qty else 1) for qty, toy in pattern.findall(text)]
+    return [(m.group(2).upper(), int(m.group(1)) if m.group(1) else 1) for m in BULK_ENTRY_RE.finditer(text)]
 
 
 def progress_map() -> Dict[str, Dict[str, int]]:
-    master = master_cache.load()
-    collection = collection_cache.load()
-    prog: Dict[str, Dict[str, int]] = {}
-    for row in master:
-        key = f"{normalize_series(row['series'])} {row['year']}"
-        prog.setdefault(key, {'total': 0, 'owned': 0})
-        prog[key]['total'] += 1
-    for row in collection:
-        key = f"{normalize_series(row['series'])} {row['year']}"
-        if key in prog:
-            prog[key]['owned'] += 1
-    return prog
+    master_cache.load()
+    collection_cache.load()
+    owned = collection_cache.counts
+    return {key: {'total': total, 'owned': owned[key]} for key, total in master_cache.counts.items()}
+
+
+def cache_etag() -> str:
+    """Validator for pages derived from the CSV caches; changes whenever either cache does."""
+    master_cache.load()
+    collection_cache.load()
+    return f'W/"{master_cache.tag}-{collection_cache.tag}"'
+
+
+def not_modified(request: Request, etag: str) -> Response | None:
+    # a list of validators, any of which may match; '*' matches any current representation
+    candidates = {v.strip() for v in request.headers.get('if-none-match', '').split(',')}
+    if '*' in candidates or etag in candidates:
+        return Response(status_code=304, headers={'ETag': etag})
+    return None
 
 
 # --------------------------- routes ---------------------------
@@ -134,7 +522,7 @@ async def form(request: Request):
 
 
 @app.post('/collect_form')
-async def collect_form(toy_number: str = Form(...), quantity: int = Form(1)):
+def collect_form(toy_number: str = Form(...), quantity: int = Form(1)):
     try:
         row = add_or_update_model(toy_number, quantity)
         return {'status': 'ok', 'added': row}
@@ -143,94 +531,117 @@ async def collect_form(toy_number: str = Form(...), quantity: int = Form(1)):
 
 
 @app.post('/collect_bulk')
-async def collect_bulk(text: str = Form(...)):
+def collect_bulk(text: str = Form(...)):
     entries = parse_bulk(text)
     if not entries:
         return {'status': 'error', 'reason': 'No valid entries found'}
-    added = []
-    for toy, qty in entries:
-        try:
-            row = add_or_update_model(toy, qty)
-            added.append(row)
-        except HTTPException:
-            continue
-    return {'status': 'ok', 'added': added}
+    return {'status': 'ok', 'added': add_or_update_model_batch(entries)}
 
 
 @app.get('/collection', response_class=HTMLResponse)
-async def show_collection(request: Request, q: str | None = None):
+def show_collection(request: Request, q: str | None = None):
+    etag = cache_etag()
+    if cached := not_modified(request, etag):
+        return cached
     rows = collection_cache.load()
     if q:
         q_low = q.lower()
         rows = [r for r in rows if q_low in r['toy_number'].lower() or q_low in r['name'].lower()]
-    total = sum(int(r['quantity']) for r in rows)
+        total = sum(int(r['quantity']) for r in rows)
+    else:
+        total = collection_cache.quantity_total()
     context = {'request': request, 'rows': rows, 'total': total, 'q': q}
-    return templates.TemplateResponse('collection.html', context)
+    return templates.TemplateResponse('collection.html', context, headers={'ETag': etag})
 
 
 @app.get('/lost', response_class=HTMLResponse)
-async def lost(request: Request):
+def lost(request: Request):
+    etag = cache_etag()
+    if cached := not_modified(request, etag):
+        return cached
     master = master_cache.load()
-    collection = {row['toy_number'] for row in collection_cache.load()}
+    collection = set(collection_cache.column('toy_number'))
     missing = [row for row in master if row['toy_number'] not in collection]
-    return templates.TemplateResponse('lost.html', {'request': request, 'rows': missing})
+    return templates.TemplateResponse('lost.html', {'request': request, 'rows': missing}, headers={'ETag': etag})
 
 
 @app.get('/compare', response_class=HTMLResponse)
-async def compare(request: Request):
-    return templates.TemplateResponse('compare.html', {'request': request, 'progress': progress_map()})
+def compare(request: Request):
+    etag = cache_etag()
+    if cached := not_modified(request, etag):
+        return cached
+    return templates.TemplateResponse('compare.html', {'request': request, 'progress': progress_map()}, headers={'ETag': etag})
 
 
 @app.get('/toy_info')
-async def toy_info(toy_number: str):
+def toy_info(toy_number: str):
     row = find_in_master(toy_number)
     if not row:
         return {'status': 'error', 'reason': 'Not found'}
-    return {'status': 'ok', 'info': row}
+    return {'status': 'ok', 'info': {k: row[k] for k in REQUIRED_FIELDS}}
 
 
 @app.post('/adjust_quantity')
-async def adjust_quantity(toy_number: str = Form(...), delta: int = Form(...)):
-    rows = collection_cache.load()
-    for row in rows:
-        if row['toy_number'] == toy_number:
-            new_q = max(int(row['quantity']) + delta, 1)
-            row['quantity'] = str(new_q)
-            collection_cache.save(rows)
-            return {'status': 'ok', 'new_quantity': new_q}
-    return {'status': 'error', 'reason': 'Model not found'}
+def adjust_quantity(toy_number: str = Form(...), delta: int = Form(...)):
+    with collection_cache.lock:
+        row = collection_cache.get(toy_number.upper())
+        if not row:
+            return {'status': 'error', 'reason': 'Model not found'}
+        new_q = max(int(row['quantity']) + delta, 1)
+        collection_cache.set_quantity(row, new_q)
+        collection_cache.commit()
+    return {'status': 'ok', 'new_quantity': new_q}
 
 
 @app.post('/delete_model')
-async def delete_model(toy_number: str = Form(...)):
-    rows = collection_cache.load()
-    new_rows = [r for r in rows if r['toy_number'] != toy_number]
-    if len(new_rows) == len(rows):
-        return {'status': 'error', 'reason': 'Model not found'}
-    collection_cache.save(new_rows)
+def delete_model(toy_number: str = Form(...)):
+    with collection_cache.lock:
+        rows = list(collection_cache.get_all(toy_number.upper()))
+        if not rows:
+            return {'status': 'error', 'reason': 'Model not found'}
+        for row in rows:
+            collection_cache.remove(row)
+        collection_cache.commit()
     return {'status': 'ok'}
 
 
 @app.get('/download_csv')
-async def download_csv():
-    rows = collection_cache.load()
-    output = io.StringIO()
-    writer = csv.DictWriter(output, fieldnames=REQUIRED_FIELDS)
-    writer.writeheader()
-    for row in rows:
-        writer.writerow(row)
-    return StreamingResponse(iter([output.getvalue()]), media_type='text/csv', headers={'Content-Disposition': 'attachment; filename=collection.csv'})
-
-
-@app.get('/json')
-async def get_json():
-    return collection_cache.load()
+def download_csv(request: Request):
+    etag = cache_etag()
+    if cached := not_modified(request, etag):
+        return cached
+    # snapshot the row list so concurrent writes don't change it mid-stream
+    rows = list(collection_cache.load())
+
+    def gen():
+        # sync generators hop to the threadpool per chunk, so yield batches rather than lines
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(REQUIRED_FIELDS)
+        for start in range(0, len(rows), DOWNLOAD_CHUNK_ROWS):
+            writer.writerows([row[k] for k in REQUIRED_FIELDS] for row in rows[start:start + DOWNLOAD_CHUNK_ROWS])
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        if buf.tell():
+            yield buf.getvalue()
+
+    headers = {'Content-Disposition': 'attachment; filename=collection.csv', 'ETag': etag}
+    return StreamingResponse(gen(), media_type='text/csv', headers=headers)
+
+
+@app.get('/json', response_class=ORJSONResponse)
+def get_json(request: Request):
+    etag = cache_etag()
+    if cached := not_modified(request, etag):
+        return cached
+    return ORJSONResponse(collection_cache.load(), headers={'ETag': etag})
 
 
 # -------------------- admin/cache endpoints --------------------
 
 @app.post('/admin/reload')
-async def admin_reload(file: str = Form(...)):
+def admin_reload(file: str = Form(...)):
     if file == 'master':
         master_cache.mtime = None
         master_cache.load()
@@ -242,9 +653,17 @@ async def admin_reload(file: str = Form(...)):
     return {'status': 'ok'}
 
 
+@app.post('/admin/compact')
+def admin_compact():
+    collection_cache.compact()
+    return {'status': 'ok'}
+
+
 @app.get('/admin/cache_status')
-async def cache_status():
+def cache_status():
     return {
         'collection_mtime': collection_cache.mtime,
         'master_mtime': master_cache.mtime,
+        'collection_version': collection_cache.version,
+        'master_version': master_cache.version,
     }
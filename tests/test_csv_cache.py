@@ -0,0 +1,266 @@
+import os
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+MASTER = (
+    "toy_number,name,year,series,image_url,quantity\n"
+    "A1,Van,2020,Mainline,img-new,\n"
+    "B2,Bus,2021,Mainline,img-b2,\n"
+)
+
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+
+
+@pytest.fixture
+def caches(tmp_path, monkeypatch):
+    master_file = tmp_path / 'master.csv'
+    write(master_file, MASTER)
+    master = main.CSVCache(
+        str(master_file), row_transform=main.with_progress_key, count_key=main.progress_key,
+    )
+    collection = main.CSVCache(
+        str(tmp_path / 'collection.csv'), count_key=main.progress_key,
+        journal_path=str(tmp_path / 'collection.jnl'),
+    )
+    monkeypatch.setattr(main, 'master_cache', master)
+    monkeypatch.setattr(main, 'collection_cache', collection)
+    return master, collection
+
+
+def quantities(rows):
+    return [(r['toy_number'], r['image_url'], r['quantity']) for r in rows]
+
+
+def test_add_increments_row_with_matching_image(caches):
+    _, collection = caches
+    collection.save([
+        {'toy_number': 'A1', 'name': 'Van', 'year': '2020', 'series': 'Mainline',
+         'image_url': 'img-old', 'quantity': '3'},
+    ])
+    main.add_or_update_model('A1', 1)
+    main.add_or_update_model('A1', 1)
+    assert quantities(collection.load()) == [('A1', 'img-old', '3'), ('A1', 'img-new', '2')]
+
+
+def test_delete_removes_every_row_for_toy(caches):
+    _, collection = caches
+    collection.save([
+        {'toy_number': 'B2', 'name': 'Bus', 'year': '2021', 'series': 'Mainline',
+         'image_url': 'img-old', 'quantity': '1'},
+    ])
+    main.add_or_update_model('B2', 1)
+    main.add_or_update_model('A1', 1)
+    assert main.delete_model('b2') == {'status': 'ok'}
+    assert quantities(collection.load()) == [('A1', 'img-new', '1')]
+    assert collection.get('B2') is None
+
+
+def test_hash_is_dropped_when_file_changes_during_parse(tmp_path, monkeypatch):
+    path = tmp_path / 'c.csv'
+    write(path, MASTER)
+    cache = main.CSVCache(str(path))
+    cache.load()
+    parse = cache._parse
+
+    def racing_parse():
+        parsed = parse()
+        # same-size rewrite landing between the parse and the end of load()
+        write(path, MASTER.replace('Van', 'Car'))
+        return parsed
+
+    monkeypatch.setattr(cache, '_parse', racing_parse)
+    cache.mtime = None
+    assert cache.load()[0]['name'] == 'Van'
+    assert cache._hash is None
+    monkeypatch.setattr(cache, '_parse', parse)
+    cache.mtime = None
+    assert cache.load()[0]['name'] == 'Car'
+
+
+def test_resized_file_is_reparsed_without_hashing(tmp_path, monkeypatch):
+    path = tmp_path / 'c.csv'
+    write(path, MASTER)
+    cache = main.CSVCache(str(path))
+    cache.load()
+    write(path, MASTER + 'C3,Car,2022,Mainline,img-c3,\n')
+    cache.mtime = None
+    hashed = []
+    monkeypatch.setattr(cache, 'fingerprint', lambda: hashed.append(1))
+    assert [r['toy_number'] for r in cache.load()] == ['A1', 'B2', 'C3']
+    assert hashed == []
+
+
+def test_download_csv_streams_in_batches(caches, monkeypatch):
+    monkeypatch.setattr(main, 'DOWNLOAD_CHUNK_ROWS', 1)
+    main.add_or_update_model_batch([('A1', 2), ('B2', 1)])
+    body = TestClient(main.app).get('/download_csv').text
+    assert body.splitlines() == [
+        ','.join(main.REQUIRED_FIELDS),
+        'A1,Van,2020,Mainline,img-new,2',
+        'B2,Bus,2021,Mainline,img-b2,1',
+    ]
+
+
+def reopen(collection):
+    return main.CSVCache(collection.path, count_key=main.progress_key, journal_path=collection.journal_path)
+
+
+def test_journal_round_trip_keeps_rows_sharing_a_toy_number(caches):
+    _, collection = caches
+    collection.save([
+        {'toy_number': 'A1', 'name': 'Van', 'year': '2020', 'series': 'Mainline',
+         'image_url': 'img-old', 'quantity': '3'},
+    ])
+    main.add_or_update_model('A1', 1)
+    main.add_or_update_model('A1', 1)
+    main.add_or_update_model('B2', 4)
+    main.adjust_quantity('A1', 2)
+    main.delete_model('B2')
+    expected = quantities(collection.load())
+    assert expected == [('A1', 'img-old', '5'), ('A1', 'img-new', '2')]
+
+    fresh = reopen(collection)
+    assert quantities(fresh.load()) == expected
+    assert fresh.quantity_total() == 7
+
+
+def test_compaction_folds_journal_into_csv(caches):
+    _, collection = caches
+    main.add_or_update_model_batch([('A1', 2), ('B2', 1)])
+    main.adjust_quantity('B2', 3)
+    collection.compact()
+    assert not os.path.exists(collection.journal_path)
+    assert quantities(reopen(collection).load()) == [('A1', 'img-new', '2'), ('B2', 'img-b2', '4')]
+
+
+def test_compaction_every_n_entries(caches):
+    _, collection = caches
+    collection.compact_every = 3
+    main.add_or_update_model('A1', 1)
+    main.add_or_update_model('A1', 1)
+    assert os.path.exists(collection.journal_path)
+    main.add_or_update_model('A1', 1)
+    assert not os.path.exists(collection.journal_path)
+    assert quantities(reopen(collection).load()) == [('A1', 'img-new', '3')]
+
+
+def test_journal_left_behind_by_compaction_is_not_replayed(caches):
+    _, collection = caches
+    main.add_or_update_model('A1', 2)
+    with open(collection.journal_path, encoding='utf-8') as f:
+        journal = f.read()
+    collection.compact()
+    # simulate a crash between the CSV swap and the journal removal
+    with open(collection.journal_path, 'w', encoding='utf-8') as f:
+        f.write(journal)
+    fresh = reopen(collection)
+    assert quantities(fresh.load()) == [('A1', 'img-new', '2')]
+    assert not os.path.exists(collection.journal_path)
+    with open(collection.journal_path + '.stale', encoding='utf-8') as f:
+        assert f.read() == journal
+
+
+def test_journal_for_hand_edited_csv_is_set_aside(caches):
+    _, collection = caches
+    main.add_or_update_model('A1', 2)
+    collection.compact()
+    main.adjust_quantity('A1', 3)
+    with open(collection.journal_path, encoding='utf-8') as f:
+        journal = f.read()
+    with open(collection.path, 'a', encoding='utf-8') as f:
+        f.write('B2,Bus,2021,Mainline,img-b2,1\n')
+    fresh = reopen(collection)
+    assert quantities(fresh.load()) == [('A1', 'img-new', '2'), ('B2', 'img-b2', '1')]
+    assert not os.path.exists(collection.journal_path)
+    with open(collection.journal_path + '.stale', encoding='utf-8') as f:
+        assert f.read() == journal
+
+
+def test_truncated_journal_line_is_skipped(caches):
+    _, collection = caches
+    main.add_or_update_model('A1', 2)
+    with open(collection.journal_path, 'a', encoding='utf-8') as f:
+        f.write('ADD,B2,Bus,2021\n')
+    assert quantities(reopen(collection).load()) == [('A1', 'img-new', '2')]
+
+
+def test_etag_changes_after_restart_with_journalled_edits(caches, monkeypatch):
+    master, collection = caches
+    main.add_or_update_model('A1', 1)
+    collection.compact()
+    before = main.cache_etag()
+    main.adjust_quantity('A1', 5)
+    assert main.cache_etag() != before
+
+    # a restarted worker starts counting versions from scratch
+    monkeypatch.setattr(main, 'master_cache', main.CSVCache(
+        master.path, row_transform=main.with_progress_key, count_key=main.progress_key,
+    ))
+    monkeypatch.setattr(main, 'collection_cache', reopen(collection))
+    assert main.collection_cache.get('A1')['quantity'] == '6'
+    assert main.cache_etag() != before
+
+
+def test_json_honours_if_none_match(caches):
+    main.add_or_update_model('A1', 1)
+    client = TestClient(main.app)
+    etag = client.get('/json').headers['etag']
+    for header in (etag, f'"other", {etag}', '*'):
+        response = client.get('/json', headers={'If-None-Match': header})
+        assert response.status_code == 304
+        assert response.headers['etag'] == etag
+    main.adjust_quantity('A1', 1)
+    assert client.get('/json', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_quantity_total_survives_concurrent_edit(caches, monkeypatch):
+    _, collection = caches
+    main.add_or_update_model('A1', 1)
+    row = collection.get('A1')
+    collection._quantity_total = None
+    column = collection.column
+    summing = threading.Event()
+
+    def slow_column(name):
+        values = column(name)
+        summing.set()
+        time.sleep(0.05)  # window for the writer to interleave
+        return values
+
+    monkeypatch.setattr(collection, 'column', slow_column)
+    reader = threading.Thread(target=collection.quantity_total)
+    reader.start()
+    summing.wait()
+    collection.set_quantity(row, 10)
+    reader.join()
+    assert collection.quantity_total() == 10
+
+
+def test_missing_column_stays_blank_for_ragged_rows(tmp_path):
+    path = tmp_path / 'c.csv'
+    write(path, 'toy_number,name,year,series,image_url\nZ9,Van,2020,S,img,EXTRA\nY8,Bus\n')
+    rows = main.CSVCache(str(path)).load()
+    assert quantities(rows) == [('Z9', 'img', ''), ('Y8', '', '')]
+
+
+def test_arrow_parser_matches_csv_parser(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = tmp_path / 'c.csv'
+    write(path, MASTER)
+    cache = main.CSVCache(str(path), use_arrow=True)
+    assert cache._parse_arrow() == cache._parse_csv()
+
+    # a repeated header name falls back to the csv module, then gets auto-fixed
+    write(path, 'toy_number,name,name,year,series,image_url,quantity\nA1,Van,Bus,2020,Mainline,img,2\n')
+    assert cache._parse() == cache._parse_csv()
+    assert quantities(cache.load()) == [('A1', 'img', '2')]
+    assert cache.load()[0]['name'] == 'Van'
+    assert cache._parse_arrow() == cache._parse_csv()